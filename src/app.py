@@ -1,15 +1,20 @@
+from __future__ import annotations
+
+import heapq
 import os
 from pathlib import Path
+from typing import TYPE_CHECKING
 
 from dotenv import load_dotenv
 import streamlit as st
 
-from llama_index.core import StorageContext, VectorStoreIndex, Settings
-from llama_index.vector_stores.qdrant import QdrantVectorStore
-from qdrant_client import QdrantClient
+# llama_index / qdrant_client are heavy to import: they are imported lazily inside the
+# functions that need them, so the UI renders before anything is asked.
+if TYPE_CHECKING:
+    from llama_index.core.schema import NodeWithScore
+    from qdrant_client import QdrantClient
 
-# Streamlit runs this file with `src/` as the script folder, so import local module directly.
-from hash_embedding import HashEmbedding
+    from cached_embedding import CachedEmbedding
 
 
 # --------------------------------------------------
@@ -17,11 +22,12 @@ from hash_embedding import HashEmbedding
 # --------------------------------------------------
 load_dotenv()
 
-# Offline embedding (must match ingestion + rag_answer)
-Settings.embed_model = HashEmbedding(dim=384)
-
 QDRANT_URL = os.getenv("QDRANT_URL", "http://localhost:6333")
 COLLECTION_NAME = os.getenv("QDRANT_COLLECTION", "docs")
+QDRANT_GRPC_PORT = int(os.getenv("QDRANT_GRPC_PORT", "6334"))
+
+# Added to a table's similarity score when "Prefer tables" is enabled
+TABLE_BONUS = float(os.getenv("TABLE_BONUS", "0.1"))
 
 # Official WHO PDF URL (for web citations)
 SOURCE_PDF_URL = os.getenv(
@@ -31,6 +37,105 @@ SOURCE_PDF_URL = os.getenv(
 )
 
 
+# --------------------------------------------------
+# Retrieval
+# --------------------------------------------------
+@st.cache_resource
+def get_embed_model() -> CachedEmbedding:
+    # Streamlit runs this file with `src/` as the script folder, so import local modules directly.
+    from cached_embedding import CachedEmbedding, DiskCachedEmbedding
+    from hash_embedding import HashEmbedding
+
+    # Offline embedding (must match ingestion + rag_answer), persisted across restarts.
+    # The in-memory query LRU sits outermost, so repeated queries never touch the disk
+    # cache; one instance per server process, so both survive reruns.
+    return CachedEmbedding(DiskCachedEmbedding(HashEmbedding(dim=384)))
+
+
+@st.cache_resource
+def get_client() -> QdrantClient:
+    from qdrant_client import QdrantClient
+
+    # Reuse one live connection across reruns instead of reconnecting per click
+    return QdrantClient(
+        url=QDRANT_URL, prefer_grpc=True, grpc_port=QDRANT_GRPC_PORT, timeout=60.0
+    )
+
+
+def iter_hits(client: QdrantClient, query_vector: list[float], limit: int):
+    """
+    Yield retrieved chunks as NodeWithScore, in the order Qdrant returns them.
+    Queries Qdrant directly (no vectors in the response) instead of going through a
+    VectorStoreIndex retriever.
+    """
+    from llama_index.core.schema import NodeWithScore
+    from llama_index.core.vector_stores.utils import metadata_dict_to_node
+
+    response = client.query_points(
+        collection_name=COLLECTION_NAME,
+        query=query_vector,
+        limit=limit,
+        with_payload=True,
+        with_vectors=False,
+    )
+    for point in response.points:
+        yield NodeWithScore(node=metadata_dict_to_node(point.payload), score=point.score)
+
+
+@st.cache_data(ttl=600, show_spinner=False)
+def retrieve_ranked(question: str, top_k: int, prefer_tables: bool):
+    """
+    Retrieve + re-rank for one (question, top_k, prefer_tables) combination.
+    Cached so Streamlit reruns with the same inputs skip Qdrant entirely.
+    Returns (top_k nodes, raw table count, raw text count).
+    """
+    client = get_client()
+
+    # With the table bonus, retrieve more than needed and re-rank (helps pull in tables).
+    # Without it the re-rank keeps Qdrant's order, so the first top_k hits are the result.
+    raw_k = top_k * 40 if (prefer_tables and TABLE_BONUS) else top_k
+    query_vector = get_embed_model().get_query_embedding(question)
+
+    # Re-rank by similarity: Qdrant already returns the cosine score for every hit, so
+    # blend it with a table bonus instead of re-embedding/re-scoring client-side.
+    # Prefer tables boosts tables, but NEVER filters out text completely.
+    # A min-heap of size top_k keeps the best hits in one pass over the stream.
+    n_tables = n_texts = 0
+    heap: list[tuple[float, int, NodeWithScore, dict]] = []
+    for seq, n in enumerate(iter_hits(client, query_vector, raw_k)):
+        meta = n.node.metadata or {}  # looked up once per hit, reused for sorting
+        is_table = meta.get("content_type") == "table"
+        if is_table:
+            n_tables += 1
+        else:
+            n_texts += 1
+
+        score = (n.score or 0.0) + (TABLE_BONUS if (prefer_tables and is_table) else 0.0)
+        item = (score, -seq, n, meta)  # on ties, earlier hits win
+        if len(heap) < top_k:
+            heapq.heappush(heap, item)
+        else:
+            heapq.heappushpop(heap, item)
+
+    # Sort for readability (tables first if prefer_tables, then page number)
+    ranked = sorted(
+        ((n, meta) for _, _, n, meta in heap),
+        key=lambda pair: (
+            0 if (prefer_tables and pair[1].get("content_type") == "table") else 1,
+            int(pair[1].get("page_number", 1_000_000_000)),
+        ),
+    )
+    nodes = [n for n, _ in ranked]
+
+    return nodes, n_tables, n_texts
+
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def load_pdf_bytes(path: str) -> bytes:
+    # Read each local PDF once; reruns get the bytes from Streamlit's cache
+    return Path(path).read_bytes()
+
+
 # --------------------------------------------------
 # UI
 # --------------------------------------------------
@@ -53,46 +158,11 @@ prefer_tables = st.checkbox("Prefer tables", value=False)
 ask = st.button("Ask")
 
 if ask:
-    # Connect to Qdrant
-    client = QdrantClient(url=QDRANT_URL, prefer_grpc=False, timeout=60.0)
-    vector_store = QdrantVectorStore(client=client, collection_name=COLLECTION_NAME)
-    storage_context = StorageContext.from_defaults(vector_store=vector_store)
-
-    # Build index wrapper around existing vector store
-    index = VectorStoreIndex.from_vector_store(
-        vector_store=vector_store,
-        storage_context=storage_context,
-    )
-
-    # Retrieve more than needed, then re-rank (helps pull in tables)
-    raw_k = top_k * (40 if prefer_tables else 12)
-    retriever = index.as_retriever(similarity_top_k=raw_k)
-    nodes = retriever.retrieve(question)
-
-    # Split by type
-    tables = [n for n in nodes if (n.node.metadata or {}).get("content_type") == "table"]
-    texts = [n for n in nodes if (n.node.metadata or {}).get("content_type") != "table"]
-
-    # Prefer tables = re-rank tables first, but NEVER filter out text completely
-    if prefer_tables:
-        nodes = tables + texts
-    else:
-        nodes = texts + tables  # keep text first by default
-
-    # Sort for readability (tables first if prefer_tables, then page number)
-    nodes = sorted(
-        nodes,
-        key=lambda n: (
-            0 if (prefer_tables and (n.node.metadata or {}).get("content_type") == "table") else 1,
-            int((n.node.metadata or {}).get("page_number", 1_000_000_000)),
-        ),
-    )
-
-    # Keep only top_k after re-ranking/sorting
-    nodes = nodes[:top_k]
+    with st.spinner("Retrieving..."):
+        nodes, n_tables, n_texts = retrieve_ranked(question, top_k, prefer_tables)
 
     # Debug counters (useful to understand what retrieval returned)
-    st.caption(f"Retrieved (raw): total={len(texts)+len(tables)} | tables={len(tables)} | text={len(texts)}")
+    st.caption(f"Retrieved (raw): total={n_texts+n_tables} | tables={n_tables} | text={n_texts}")
 
     if not nodes:
         st.error("No results at all. Check that ingestion ran and Qdrant collection contains points.")
@@ -102,15 +172,21 @@ if ask:
     # Grounded answer
     # --------------------------------------------------
     st.subheader("Grounded answer (extracts)")
+    # (source, page) pairs to cite, deduplicated in first-seen order while rendering
+    citations: dict[tuple[str, int], None] = {}
     for i, n in enumerate(nodes, start=1):
         meta = n.node.metadata or {}
         src = meta.get("source_document", "unknown")
         page = int(meta.get("page_number", -1))
         ctype = meta.get("content_type", "unknown")
         table_id = meta.get("table_id")
+        if src != "unknown" and page != -1:
+            citations.setdefault((src, page), None)
 
-        content = (n.node.get_content() or "").strip()
-        if len(content) > 1200:
+        # Slice before strip: only the displayed prefix is ever scanned
+        raw = n.node.get_content() or ""
+        content = raw[:1300].strip()
+        if len(content) > 1200 or len(raw) > 1300:
             content = content[:1200] + "..."
 
         tag = f" [{ctype.upper()}]"
@@ -122,34 +198,30 @@ if ask:
     # Sources (local download + web link)
     # --------------------------------------------------
     st.subheader("Sources")
-    seen = set()
-
-    for n in nodes:
-        meta = n.node.metadata or {}
-        src = meta.get("source_document", "unknown")
-        page = int(meta.get("page_number", -1))
-        key = (src, page)
-
-        if src == "unknown" or page == -1 or key in seen:
-            continue
-        seen.add(key)
+    pdf_bytes_by_src: dict[str, bytes | None] = {}  # one load per source, not per page
 
+    for src, page in citations:
         st.write(f"**{src} — p.{page}**")
 
         col1, col2 = st.columns(2)
 
         # Local PDF download
         with col1:
-            local_path = Path("data/samples") / src
-            if src and local_path.exists():
-                with open(local_path, "rb") as f:
-                    st.download_button(
-                        label="📄 Local PDF (download)",
-                        data=f,
-                        file_name=src,
-                        mime="application/pdf",
-                        key=f"dl_{src}_{page}",
-                    )
+            if src not in pdf_bytes_by_src:
+                local_path = Path("data/samples") / src
+                pdf_bytes_by_src[src] = (
+                    load_pdf_bytes(str(local_path)) if (src and local_path.exists()) else None
+                )
+            pdf_bytes = pdf_bytes_by_src[src]
+
+            if pdf_bytes is not None:
+                st.download_button(
+                    label="📄 Local PDF (download)",
+                    data=pdf_bytes,
+                    file_name=src,
+                    mime="application/pdf",
+                    key=f"dl_{src}_{page}",
+                )
             else:
                 st.write("Local PDF not available")
 
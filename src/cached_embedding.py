@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import functools
+import hashlib
+import os
+from typing import List, Optional, Tuple
+
+import diskcache
+from llama_index.core.embeddings import BaseEmbedding
+
+EMBED_CACHE_DIR = os.getenv("EMBED_CACHE_DIR", "./.cache/embeddings")
+
+
+class CachedEmbedding(BaseEmbedding):
+    """
+    Wraps another embedding model and memoizes query embeddings in memory.
+    Document embeddings are passed through untouched (they rarely repeat and
+    would just evict useful query entries).
+    """
+
+    def __init__(self, base: BaseEmbedding, query_cache_size: int = 1024):
+        super().__init__(
+            model_name=base.model_name,
+            embed_batch_size=base.embed_batch_size,
+        )
+        self._base = base
+        self._cached_query_vec = functools.lru_cache(maxsize=query_cache_size)(
+            self._query_vec
+        )
+
+    def _query_vec(self, query: str) -> Tuple[float, ...]:
+        return tuple(self._base._get_query_embedding(query))
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return list(self._cached_query_vec(query))
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return list(self._cached_query_vec(query))
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._base._get_text_embedding(text)
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return self._base._get_text_embeddings(texts)
+
+    async def _aget_text_embedding(self, text: str) -> List[float]:
+        return await self._base._aget_text_embedding(text)
+
+
+class DiskCachedEmbedding(BaseEmbedding):
+    """
+    Wraps another embedding model and persists every embedding on disk, so
+    reruns (re-ingesting unchanged pages, repeated eval runs) skip the model.
+    Keys are sha256(kind + model_name + text): queries and documents are cached
+    separately since some models embed them differently.
+    """
+
+    def __init__(self, base: BaseEmbedding, cache_dir: Optional[str] = None):
+        super().__init__(
+            model_name=base.model_name,
+            embed_batch_size=base.embed_batch_size,
+        )
+        self._base = base
+        self._cache = diskcache.Cache(cache_dir or EMBED_CACHE_DIR)
+
+    def _key(self, kind: str, text: str) -> str:
+        return hashlib.sha256(f"{kind}\0{self.model_name}\0{text}".encode("utf-8")).hexdigest()
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        key = self._key("query", query)
+        emb = self._cache.get(key)
+        if emb is None:
+            emb = self._base._get_query_embedding(query)
+            self._cache.set(key, emb)
+        return emb
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        key = self._key("query", query)
+        emb = self._cache.get(key)
+        if emb is None:
+            emb = await self._base._aget_query_embedding(query)
+            self._cache.set(key, emb)
+        return emb
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._get_text_embeddings([text])[0]
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        keys = [self._key("text", t) for t in texts]
+        out: List[Optional[List[float]]] = [self._cache.get(k) for k in keys]
+
+        # Embed only the cache misses (in one batch), persist them, then recombine
+        missing = [i for i, emb in enumerate(out) if emb is None]
+        if missing:
+            new_embs = self._base._get_text_embeddings([texts[i] for i in missing])
+            # One SQLite transaction for the whole batch instead of one commit per entry
+            with self._cache.transact():
+                for i, emb in zip(missing, new_embs):
+                    self._cache.set(keys[i], emb)
+                    out[i] = emb
+        return out
+
+    async def _aget_text_embedding(self, text: str) -> List[float]:
+        key = self._key("text", text)
+        emb = self._cache.get(key)
+        if emb is None:
+            emb = await self._base._aget_text_embedding(text)
+            self._cache.set(key, emb)
+        return emb
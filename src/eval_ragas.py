@@ -1,3 +1,4 @@
+import asyncio
 import os
 import pandas as pd
 
@@ -14,25 +15,33 @@ except ImportError:
     from ragas.metrics import answer_relevancy as answer_relevance  # older/most common name
 
 
-from llama_index.core import VectorStoreIndex, StorageContext, Settings
-from llama_index.vector_stores.qdrant import QdrantVectorStore
-from qdrant_client import QdrantClient
+from llama_index.core import Settings, get_response_synthesizer
+from llama_index.core.schema import NodeWithScore, QueryBundle
+from llama_index.core.vector_stores.utils import metadata_dict_to_node
+from qdrant_client import AsyncQdrantClient, models
 from llama_index.embeddings.huggingface import HuggingFaceEmbedding
 from llama_index.llms.openai import OpenAI
 
+# Run as `python src/eval_ragas.py`, so `src/` is the script folder: import local module directly.
+from cached_embedding import CachedEmbedding, DiskCachedEmbedding
+
 # --------------------------------------------------
 # Setup
 # --------------------------------------------------
 load_dotenv()
 
-Settings.embed_model = HuggingFaceEmbedding(
-    model_name="sentence-transformers/all-MiniLM-L6-v2"
+# In-memory query LRU on top of a persistent cache, so reruns skip MiniLM entirely
+Settings.embed_model = CachedEmbedding(
+    DiskCachedEmbedding(
+        HuggingFaceEmbedding(model_name="sentence-transformers/all-MiniLM-L6-v2")
+    )
 )
 
 Settings.llm = OpenAI(model="gpt-4o-mini", temperature=0)
 
 QDRANT_URL = os.getenv("QDRANT_URL", "http://localhost:6333")
 COLLECTION_NAME = os.getenv("QDRANT_COLLECTION", "docs")
+QDRANT_GRPC_PORT = int(os.getenv("QDRANT_GRPC_PORT", "6334"))
 
 # --------------------------------------------------
 # Load questions
@@ -42,30 +51,71 @@ df = pd.read_csv("eval/questions.csv")
 # --------------------------------------------------
 # RAG pipeline
 # --------------------------------------------------
-client = QdrantClient(url=QDRANT_URL, prefer_grpc=False, timeout=60.0)
-vector_store = QdrantVectorStore(client=client, collection_name=COLLECTION_NAME)
-storage_context = StorageContext.from_defaults(vector_store=vector_store)
-
-index = VectorStoreIndex.from_vector_store(
-    vector_store=vector_store,
-    storage_context=storage_context,
+# Async client for the batched retrieval below (answers are synthesized from its results,
+# so no LlamaIndex vector store / retriever is needed)
+aclient = AsyncQdrantClient(
+    url=QDRANT_URL, prefer_grpc=True, grpc_port=QDRANT_GRPC_PORT, timeout=60.0
 )
 
-retriever = index.as_retriever(similarity_top_k=5)
-
-questions = []
-answers = []
-contexts = []
-
-for q in df["question"]:
-    nodes = retriever.retrieve(q)
-
-    ctx = [n.node.get_content() for n in nodes]
-    answer = index.as_query_engine().query(q).response
-
-    questions.append(q)
-    answers.append(str(answer))
-    contexts.append(ctx)
+TOP_K = 5
+# Max in-flight LLM calls (keep within OpenAI rate limits)
+EVAL_CONCURRENCY = int(os.getenv("EVAL_CONCURRENCY", "8"))
+
+questions = df["question"].tolist()
+
+# Embed every question once, on the query path (cached in memory + on disk)
+query_vectors = [Settings.embed_model.get_query_embedding(q) for q in questions]
+
+# One response synthesizer (Settings.llm) for every question
+synthesizer = get_response_synthesizer()
+
+
+async def retrieve_nodes(vectors: list[list[float]]) -> list[list[NodeWithScore]]:
+    # Retrieval: one batched request over async gRPC instead of one round trip per question
+    batch_results = await aclient.query_batch_points(
+        collection_name=COLLECTION_NAME,
+        requests=[
+            models.QueryRequest(query=v, limit=TOP_K, with_payload=True)
+            for v in vectors
+        ],
+    )
+    return [
+        [NodeWithScore(node=metadata_dict_to_node(p.payload), score=p.score) for p in res.points]
+        for res in batch_results
+    ]
+
+
+async def generate_answers(
+    qs: list[str],
+    vectors: list[list[float]],
+    nodes_per_q: list[list[NodeWithScore]],
+) -> list[str]:
+    # Generation from the already-retrieved nodes (no second search per question), so the
+    # LLM sees exactly the RAGAS contexts. LLM calls overlap, capped by a semaphore.
+    sem = asyncio.Semaphore(EVAL_CONCURRENCY)
+
+    async def answer(q: str, v: list[float], nodes: list[NodeWithScore]) -> str:
+        async with sem:
+            response = await synthesizer.asynthesize(QueryBundle(q, embedding=v), nodes)
+            return str(response.response)
+
+    return list(
+        await asyncio.gather(*(answer(q, v, n) for q, v, n in zip(qs, vectors, nodes_per_q)))
+    )
+
+
+async def run_pipeline() -> tuple[list[list[str]], list[str]]:
+    # Retrieve first (one batched request), then generate every answer from those nodes
+    try:
+        nodes_per_q = await retrieve_nodes(query_vectors)
+    finally:
+        await aclient.close()
+    answers = await generate_answers(questions, query_vectors, nodes_per_q)
+    contexts = [[n.node.get_content() for n in nodes] for nodes in nodes_per_q]
+    return contexts, answers
+
+
+contexts, answers = asyncio.run(run_pipeline())
 
 # --------------------------------------------------
 # Build RAGAS dataset
@@ -1,4 +1,6 @@
 import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
 
 import fitz  # PyMuPDF
@@ -7,19 +9,34 @@ from dotenv import load_dotenv
 # Workaround for some environments (Codespaces) where httpx/http2 can be flaky
 os.environ["HTTPX_USE_HTTP2"] = "0"
 
-from llama_index.core import Document, VectorStoreIndex, StorageContext, Settings
-from llama_index.vector_stores.qdrant import QdrantVectorStore
-from qdrant_client import QdrantClient
+from llama_index.core import Document, Settings
+from llama_index.core.schema import MetadataMode
+from llama_index.core.vector_stores.utils import node_to_metadata_dict
+from qdrant_client import QdrantClient, models
 
+from src.cached_embedding import DiskCachedEmbedding
 from src.hash_embedding import HashEmbedding
 
 load_dotenv()
 
-# Offline embeddings (no HuggingFace/OpenAI downloads needed)
-Settings.embed_model = HashEmbedding(dim=384)
+# Offline embeddings (no HuggingFace/OpenAI downloads needed), cached on disk so
+# re-ingesting unchanged pages skips embedding
+EMBED_DIM = 384
+Settings.embed_model = DiskCachedEmbedding(HashEmbedding(dim=EMBED_DIM))
 
 QDRANT_URL = os.getenv("QDRANT_URL", "http://localhost:6333")
 COLLECTION_NAME = os.getenv("QDRANT_COLLECTION", "docs")
+QDRANT_GRPC_PORT = int(os.getenv("QDRANT_GRPC_PORT", "6334"))
+
+# Chunks are embedded in batches before being written to Qdrant
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+UPLOAD_BATCH_SIZE = int(os.getenv("UPLOAD_BATCH_SIZE", "256"))
+# Finished documents handed to the background embed + upload thread per job
+PIPELINE_CHUNK_DOCS = int(os.getenv("PIPELINE_CHUNK_DOCS", "256"))
+
+# Drop and recreate the collection before ingesting (needed after embedding changes,
+# otherwise new points are mixed with stale, incompatible ones)
+QDRANT_RECREATE = os.getenv("QDRANT_RECREATE", "0").lower() in ("1", "true", "yes")
 
 SOURCE_PDF_URL = os.getenv(
     "SOURCE_PDF_URL",
@@ -56,63 +73,140 @@ def table_to_markdown(table) -> str:
     return "\n".join(md)
 
 
-def pdf_to_documents(pdf_path: Path) -> list[Document]:
+def page_to_documents(page, source_document: str, source_url: str) -> list[Document]:
     """
-    Create Documents for:
-    - text per page (content_type=text)
-    - each table per page (content_type=table, with table_id)
+    Create Documents for a single PyMuPDF page:
+    - page text (content_type=text)
+    - each table on the page (content_type=table, with table_id)
     """
-    doc = fitz.open(pdf_path)
+    page_number = page.number + 1
     out: list[Document] = []
 
-    for page_idx in range(len(doc)):
-        page = doc[page_idx]
-        page_number = page_idx + 1
-
-        # ---- TEXT ----
-        text = page.get_text("text").strip()
-        if text:
-            out.append(
-                Document(
-                    text=text,
-                    metadata={
-                        "source_document": pdf_path.name,
-                        "page_number": page_number,
-                        "content_type": "text",
-                        "source_url": SOURCE_PDF_URL,
-                    },
-                )
-            )
+    # ---- TEXT ----
+    # Text blocks only (type 0), in reading order; image blocks are skipped
+    blocks = page.get_text("blocks", sort=True)
+    text = "\n".join(b[4] for b in blocks if b[6] == 0).strip()
+    if not text:
+        # Blank or image-only page: a table here would have no text to index either,
+        # so skip the (expensive) table detection entirely
+        return out
 
-        # ---- TABLES ----
-        try:
-            tables = page.find_tables()
-            if tables and tables.tables:
-                for t_i, t in enumerate(tables.tables, start=1):
-                    md = table_to_markdown(t).strip()
-                    if not md:
-                        continue
-                    # Add a small prefix so retrieval knows it's a table
-                    table_text = f"TABLE (page {page_number}, table {t_i})\n{md}"
-                    out.append(
-                        Document(
-                            text=table_text,
-                            metadata={
-                                "source_document": pdf_path.name,
-                                "page_number": page_number,
-                                "content_type": "table",
-                                "table_id": t_i,
-                                "source_url": SOURCE_PDF_URL,
-                            },
-                        )
+    out.append(
+        Document(
+            text=text,
+            metadata={
+                "source_document": source_document,
+                "page_number": page_number,
+                "content_type": "text",
+                "source_url": source_url,
+            },
+        )
+    )
+
+    # ---- TABLES ----
+    try:
+        tables = page.find_tables()
+        if tables and tables.tables:
+            for t_i, t in enumerate(tables.tables, start=1):
+                md = table_to_markdown(t).strip()
+                if not md:
+                    continue
+                # Add a small prefix so retrieval knows it's a table
+                table_text = f"TABLE (page {page_number}, table {t_i})\n{md}"
+                out.append(
+                    Document(
+                        text=table_text,
+                        metadata={
+                            "source_document": source_document,
+                            "page_number": page_number,
+                            "content_type": "table",
+                            "table_id": t_i,
+                            "source_url": source_url,
+                        },
                     )
-        except Exception:
-            # If table extraction fails on some pages, we still keep text
-            pass
+                )
+    except Exception:
+        # If table extraction fails on some pages, we still keep text
+        pass
 
     return out
 
 
+def _process_page(pdf_path: Path, page_idx: int, source_url: str) -> list[Document]:
+    """
+    Worker entry point for parallel ingestion.
+    fitz.Document isn't picklable, so each task reopens the PDF itself.
+    """
+    doc = fitz.open(pdf_path, filetype="pdf")
+    try:
+        return page_to_documents(doc[page_idx], pdf_path.name, source_url)
+    finally:
+        doc.close()
+
+
+def ensure_collection(client: QdrantClient, dim: int, recreate: bool = False) -> None:
+    """
+    Create the collection (single unnamed cosine vector, the layout
+    QdrantVectorStore reads) if it doesn't exist yet, or drop and recreate it
+    when `recreate` is set.
+    Vectors are stored as float16 with an int8-quantized copy for the ANN search
+    (top hits are rescored against the float16 originals).
+    """
+    if client.collection_exists(COLLECTION_NAME):
+        if not recreate:
+            print(
+                f"[ingest] Appending to existing collection '{COLLECTION_NAME}' "
+                "(set QDRANT_RECREATE=1 to rebuild it)"
+            )
+            return
+        print(f"[ingest] Recreating collection '{COLLECTION_NAME}'")
+        client.delete_collection(COLLECTION_NAME)
+    client.create_collection(
+        collection_name=COLLECTION_NAME,
+        vectors_config=models.VectorParams(
+            size=dim,
+            distance=models.Distance.COSINE,
+            datatype=models.Datatype.FLOAT16,
+        ),
+        quantization_config=models.ScalarQuantization(
+            scalar=models.ScalarQuantizationConfig(
+                type=models.ScalarType.INT8,
+                always_ram=True,
+            ),
+        ),
+    )
+
+
+def index_documents(client: QdrantClient, docs: list[Document]) -> None:
+    """
+    Same chunking as VectorStoreIndex.from_documents, but embed everything in large
+    batches up front and upsert raw points, skipping the vector store's per-node path.
+    Payloads match what QdrantVectorStore writes, so retrieval via LlamaIndex still works.
+    """
+    nodes = Settings.node_parser.get_nodes_from_documents(docs)
+    # No progress bar: this runs once per pipeline chunk in a background thread
+    embeddings = Settings.embed_model.get_text_embedding_batch(
+        [n.get_content(metadata_mode=MetadataMode.EMBED) for n in nodes]
+    )
+
+    points = [
+        models.PointStruct(
+            id=n.node_id,
+            vector=emb,
+            payload=node_to_metadata_dict(n, remove_text=False, flat_metadata=False),
+        )
+        for n, emb in zip(nodes, embeddings)
+    ]
+    # Plain upserts from the existing upload thread: upload_points(parallel > 1) would
+    # start a fresh worker-process pool (and gRPC connections) on every chunk
+    for start in range(0, len(points), UPLOAD_BATCH_SIZE):
+        client.upsert(
+            collection_name=COLLECTION_NAME,
+            points=points[start : start + UPLOAD_BATCH_SIZE],
+            wait=True,  # like QdrantVectorStore.add: points are applied (errors surface) before returning
+        )
+
+
 def main():
     samples_dir = Path("data/samples")
     if not samples_dir.exists():
@@ -122,24 +216,59 @@ def main():
     if not pdfs:
         raise SystemExit("No PDFs found in data/samples. Add at least one PDF.")
 
-    client = QdrantClient(url=QDRANT_URL, prefer_grpc=False, timeout=60.0)
-    vector_store = QdrantVectorStore(client=client, collection_name=COLLECTION_NAME)
-    storage_context = StorageContext.from_defaults(vector_store=vector_store)
+    client = QdrantClient(
+        url=QDRANT_URL, prefer_grpc=True, grpc_port=QDRANT_GRPC_PORT, timeout=60.0
+    )
+    Settings.embed_model.embed_batch_size = EMBED_BATCH_SIZE
+    ensure_collection(client, EMBED_DIM, recreate=QDRANT_RECREATE)
 
-    all_docs: list[Document] = []
+    page_counts = {}
     for pdf in pdfs:
-        docs = pdf_to_documents(pdf)
-        # Count text vs tables for logging
-        text_count = sum(1 for d in docs if d.metadata.get("content_type") == "text")
-        table_count = sum(1 for d in docs if d.metadata.get("content_type") == "table")
-        print(f"[ingest] {pdf.name}: text_pages={text_count}, tables={table_count}")
-        all_docs.extend(docs)
-
-    if not all_docs:
+        with fitz.open(pdf, filetype="pdf") as doc:
+            page_counts[pdf] = len(doc)
+
+    # Pages are parsed in worker processes (table detection is CPU-bound), while a
+    # single background thread embeds + upserts every PIPELINE_CHUNK_DOCS finished documents
+    # (in page order), so both stages overlap even within a single PDF.
+    total_docs = 0
+    parse_pool = ProcessPoolExecutor(max_workers=os.cpu_count())
+    upload_pool = ThreadPoolExecutor(max_workers=1)
+    with parse_pool, upload_pool:
+        page_futures = {
+            pdf: [
+                parse_pool.submit(_process_page, pdf, page_idx, SOURCE_PDF_URL)
+                for page_idx in range(n_pages)
+            ]
+            for pdf, n_pages in page_counts.items()
+        }
+
+        uploads = []
+        pending: list[Document] = []
+        for pdf in pdfs:
+            counts = Counter()
+            # Collect in page order so chunk order stays deterministic
+            for f in page_futures[pdf]:
+                page_docs = f.result()
+                # Count text vs tables for logging
+                counts.update(d.metadata.get("content_type") for d in page_docs)
+                pending.extend(page_docs)
+                if len(pending) >= PIPELINE_CHUNK_DOCS:
+                    total_docs += len(pending)
+                    uploads.append(upload_pool.submit(index_documents, client, pending))
+                    pending = []
+            print(f"[ingest] {pdf.name}: text_pages={counts['text']}, tables={counts['table']}")
+
+        if pending:
+            total_docs += len(pending)
+            uploads.append(upload_pool.submit(index_documents, client, pending))
+
+        for f in uploads:
+            f.result()
+
+    if not total_docs:
         raise SystemExit("No content extracted from PDFs (are they scanned images?).")
 
-    VectorStoreIndex.from_documents(all_docs, storage_context=storage_context)
-    print(f"[ok] Indexed {len(all_docs)} documents into '{COLLECTION_NAME}' at {QDRANT_URL}")
+    print(f"[ok] Indexed {total_docs} documents into '{COLLECTION_NAME}' at {QDRANT_URL}")
 
 
 if __name__ == "__main__":
@@ -5,15 +5,17 @@ from llama_index.core import StorageContext, VectorStoreIndex, Settings
 from llama_index.vector_stores.qdrant import QdrantVectorStore
 from qdrant_client import QdrantClient
 
+from src.cached_embedding import DiskCachedEmbedding
 from src.hash_embedding import HashEmbedding
 
 load_dotenv()
 
 # Offline embedding (must match ingestion)
-Settings.embed_model = HashEmbedding(dim=384)
+Settings.embed_model = DiskCachedEmbedding(HashEmbedding(dim=384))
 
 QDRANT_URL = os.getenv("QDRANT_URL", "http://localhost:6333")
 COLLECTION_NAME = os.getenv("QDRANT_COLLECTION", "docs")
+QDRANT_GRPC_PORT = int(os.getenv("QDRANT_GRPC_PORT", "6334"))
 
 
 def make_clickable_source(source_document: str, page_number: int) -> str:
@@ -24,7 +26,9 @@ def make_clickable_source(source_document: str, page_number: int) -> str:
 def main():
     question = os.getenv("QUESTION") or "What does the report say about life expectancy?"
 
-    client = QdrantClient(url=QDRANT_URL, prefer_grpc=False, timeout=60.0)
+    client = QdrantClient(
+        url=QDRANT_URL, prefer_grpc=True, grpc_port=QDRANT_GRPC_PORT, timeout=60.0
+    )
     vector_store = QdrantVectorStore(client=client, collection_name=COLLECTION_NAME)
     storage_context = StorageContext.from_defaults(vector_store=vector_store)
 
@@ -44,29 +48,32 @@ def main():
     print("\n=== QUESTION ===")
     print(question)
 
-    print("\n=== GROUNDED ANSWER (extracts) ===")
-    for i, n in enumerate(nodes, start=1):
+    # One pass over the nodes: extracts + deduplicated (source, page) citations.
+    # A dict keeps first-seen order while deduplicating.
+    extracts = []
+    citations: dict[tuple[str, int], None] = {}
+    for n in nodes:
         meta = n.node.metadata or {}
-        text = (n.node.get_content() or "").strip().replace("\n", " ")
-        if len(text) > 350:
+        # Slice before strip/replace: only the printed prefix is ever scanned
+        raw = n.node.get_content() or ""
+        text = raw[:450].strip().replace("\n", " ")
+        if len(text) > 350 or len(raw) > 450:
             text = text[:350] + "..."
-        print(f"{i}. {text}")
+        extracts.append(text)
 
-    # Clickable citations (deduplicated)
-    seen = set()
-    sources = []
-    for n in nodes:
-        meta = n.node.metadata or {}
         src = meta.get("source_document", "unknown")
         page = int(meta.get("page_number", -1))
-        key = (src, page)
-        if src != "unknown" and page != -1 and key not in seen:
-            seen.add(key)
-            sources.append(make_clickable_source(src, page))
+        if src != "unknown" and page != -1:
+            citations.setdefault((src, page), None)
 
+    print("\n=== GROUNDED ANSWER (extracts) ===")
+    for i, text in enumerate(extracts, start=1):
+        print(f"{i}. {text}")
+
+    # Clickable citations (deduplicated)
     print("\n=== SOURCES (clickable) ===")
-    for s in sources:
-        print("-", s)
+    for src, page in citations:
+        print("-", make_clickable_source(src, page))
 
 
 if __name__ == "__main__":